@@ -0,0 +1,293 @@
+import csv
+
+import numpy as np
+
+from PV import PV
+from utils import State
+
+"""
+Vectorized simulation of many independent networks with the same
+parameters. Positions, energy, state and topology are stacked arrays with a
+leading batch dimension, and every step of a round in main.run is applied to
+all networks at once:
+
+    positions   (B, N, 2)   node 0 is the controller at (100, 100)
+    E           (B, N)      E_rank_u of every node
+    state       (B, N)      State values
+    adjacency   (B, N, N)   current topology, orig_topology is complete
+    received    (B, N, N)   received[b, u, v] if u received main data from v
+
+ECCKN decisions are taken node by node in the Controller's order, with all
+networks advanced together. Transmissions are computed synchronously from the
+energies at the start of each step, while Controller goes through the nodes
+one at a time, so a node close to running out may transmit once more here.
+"""
+
+METRICS = ['alive', 'sleeping', 'dead', 'isolated']
+
+
+class BatchSimulation:
+    # radio parameters, as in Sensor
+    E_elec = 1
+    eps_amp = 1
+    l_beacon = 1
+
+    def __init__(self, n_networks=100, n_nodes=50, pv_area=1.23,
+                 E_rank_u=20001, seed=None):
+        """
+        :param n_networks: Number of independent networks B
+        :param n_nodes: Number of sensor nodes per network, besides the controller
+        :param pv_area: Solar panel area in m^2
+        :param E_rank_u: Initial energy of every node
+        :param seed: Random seed of node positions
+        """
+        self.n_networks = n_networks
+        self.n_nodes = n_nodes
+        self.random = np.random.RandomState(seed)
+        self.pv = PV(area=pv_area)
+
+        B, N = n_networks, n_nodes + 1
+        self.positions = np.full((B, N, 2), 100)
+        self.positions[:, 1:] = self.random.randint(1, 200, (B, n_nodes, 2))
+        # redraw the networks with two nodes on the same position
+        while True:
+            codes = np.sort(self.positions[..., 0] * 200 +
+                            self.positions[..., 1], axis=1)
+            dupes = (np.diff(codes, axis=1) == 0).any(axis=1)
+            if not dupes.any():
+                break
+            self.positions[dupes, 1:] = self.random.randint(
+                1, 200, (dupes.sum(), n_nodes, 2))
+
+        diff = self.positions[:, :, None, :] - self.positions[:, None, :, :]
+        self.W = np.sqrt((diff ** 2).sum(axis=-1))
+        self.complete = ~np.eye(N, dtype=bool)[None].repeat(B, axis=0)
+        self.is_sensor = np.arange(N) > 0
+        # sensor nodes from farthest to nearest to the controller, the order
+        # Controller sorts them in
+        self.order = np.argsort(-self.W[:, 1:, 0], axis=1, kind='stable') + 1
+
+        self.E = np.full((B, N), float(E_rank_u))
+        self.state = np.full((B, N), State.INIT.value, dtype=np.int8)
+        self.isolated = np.zeros((B, N), dtype=bool)
+        self.l_main = np.ones((B, N))
+        self.received = np.zeros((B, N, N), dtype=bool)
+        self.target = np.full((B, N), -1)
+        self.target_distance = np.zeros((B, N))
+        self.adjacency = self.complete.copy()
+
+        # every beacon target is the controller, and the controller transmits
+        # to every node once a round
+        self.beacon_usage = self.E_elec * self.l_beacon + \
+            self.eps_amp * self.l_beacon * self.W[:, :, 0] ** 2
+        self.controller_usage = self.beacon_usage[:, 1:].sum(axis=1)
+
+        self.metrics = {name: [] for name in METRICS}
+
+        self.update_topology()
+        self.update_targets()
+        self.E[:, 0] -= 1519
+
+    def is_state(self, state):
+        return self.state == state.value
+
+    def set_state(self, mask, state):
+        """
+        Move the sensor nodes in mask to state, where it is a valid transition
+        """
+        mask = mask & self.is_sensor & ~self.is_state(State.DEAD)
+        if state == State.DEAD:
+            mask &= ~self.is_state(State.INIT)
+        self.state[mask] = state.value
+
+    def transmit_beacon(self, mask):
+        """
+        Sensor nodes in mask transmit beacon data to the controller, if possible
+        """
+        mask = mask & (self.beacon_usage <= self.E)
+        self.E -= np.where(mask, self.beacon_usage, 0)
+        self.E[:, 0] -= self.E_elec * self.l_beacon * mask.sum(axis=1)
+
+    def transmit_main(self):
+        """
+        Awake sensor nodes with a target transmit main data to it, the others
+        transmit beacon data to the controller
+        """
+        alive = self.is_sensor & ~self.is_state(State.DEAD)
+        main = alive & self.is_state(State.AWAKE) & (self.target >= 0)
+        self.transmit_beacon(alive & ~main)
+
+        usage = self.E_elec * self.l_main + \
+            self.eps_amp * self.l_main * self.target_distance ** 2
+        main &= usage <= self.E
+        self.E -= np.where(main, usage, 0)
+
+        b, v = np.nonzero(main)
+        u = self.target[b, v]
+        receiving = self.state[b, u] != State.DEAD.value
+        b, v, u = b[receiving], v[receiving], u[receiving]
+        awake = self.state[b, u] == State.AWAKE.value
+        rx = np.where(awake, self.E_elec * self.l_main[b, u],
+                      self.E_elec * self.l_beacon)
+        np.subtract.at(self.E, (b, u), rx)
+        self.received[b[awake], u[awake], v[awake]] = True
+
+    def update_topology(self):
+        """
+        Edges are discarded if E rank of sensor nodes are insufficient to
+        reach other nodes, or either node is asleep
+        """
+        requirement = self.E_elec * self.l_main[:, :, None] + \
+            self.eps_amp * self.l_main[:, :, None] * self.W ** 2
+        keep = requirement < self.E[:, :, None]
+        keep &= np.swapaxes(keep, 1, 2)
+        awake = ~self.is_state(State.SLEEP)
+        self.adjacency = self.complete & keep & \
+            awake[:, :, None] & awake[:, None, :]
+
+    def update_targets(self):
+        """
+        Next hop of every sensor node on its shortest path to the controller,
+        by Bellman-Ford relaxation towards node 0
+        """
+        W = np.where(self.adjacency, self.W, np.inf)
+        distance = np.full(self.E.shape, np.inf)
+        distance[:, 0] = 0
+        for _ in range(self.n_nodes):
+            new_distance = np.minimum(
+                distance, (W + distance[:, None, :]).min(axis=2))
+            if np.array_equal(new_distance, distance):
+                break
+            distance = new_distance
+
+        next_hop = (W + distance[:, None, :]).argmin(axis=2)
+        reachable = np.isfinite(distance)
+        alive = self.is_sensor & ~self.is_state(State.DEAD)
+        self.target[alive] = np.where(reachable, next_hop, -1)[alive]
+        self.target_distance[alive] = np.where(reachable, distance, 0)[alive]
+        self.set_state(alive, State.AWAKE)
+
+    def run_ECCKN(self, k=3):
+        """
+        ECCKN sleep decision of every sensor node, see Controller.run_ECCKN.
+        Nodes decide one at a time in self.order, so each decision sees the
+        awake states left by the previous ones
+        """
+        A = self.adjacency
+        E = self.E
+        rows = np.arange(self.n_networks)
+
+        # E_u only ever holds the nodes with E_rank_v > E_rank_u, so each
+        # condition below holds iff the weakest node of the best qualifying
+        # pair (or triple) has more energy than s_u
+        pair = np.minimum(E[:, :, None], E[:, None, :])
+        best_hop_1 = np.where(A, pair, -np.inf).max(axis=(1, 2))
+
+        hop_2_E = np.full(A.shape, -np.inf)
+        for w in range(1, self.n_nodes + 1):
+            common = A[:, :, w, None] & A[:, None, w, :]
+            np.maximum(hop_2_E, np.where(common, E[:, w, None, None], -np.inf),
+                       out=hop_2_E)
+        hop_2_pair = np.minimum(pair, hop_2_E)
+
+        # any s_v in N_u has at least k neighbors from E_u, always true for
+        # k <= 0 and never for more than the n_nodes other nodes of s_v
+        if k <= 0:
+            cond2 = np.ones(E.shape, dtype=bool)
+        elif k > self.n_nodes:
+            cond2 = np.zeros(E.shape, dtype=bool)
+        else:
+            neighbor_E = np.sort(np.where(A, E[:, None, :], -np.inf), axis=2)
+            kth = neighbor_E[:, :, -k]
+            cond2 = np.where(self.complete, kth[:, None, :],
+                             -np.inf).max(axis=2) > E
+
+        Af = A.astype(float)
+        awake = self.is_state(State.AWAKE)
+        hop_2_awake = np.matmul(Af * awake[:, None, :], Af)
+        best_hop_2 = np.where(hop_2_awake > 1, hop_2_pair,
+                              -np.inf).max(axis=(1, 2))
+        for u in self.order.T:
+            # |N_u| < k or |N_v| < k for any s_v in N_u, remain awake
+            few = awake.sum(axis=1, keepdims=True) - awake < k
+            stay_awake = few[rows, u] | (few.sum(axis=1) - few[rows, u] > 0)
+            cond1 = np.maximum(best_hop_1, best_hop_2) > E[rows, u]
+
+            sleep = np.zeros(awake.shape, dtype=bool)
+            sleep[rows, u] = ~stay_awake & cond1 & cond2[rows, u]
+            node = np.zeros(awake.shape, dtype=bool)
+            node[rows, u] = True
+            self.set_state(node & sleep, State.SLEEP)
+            self.set_state(node & ~sleep, State.AWAKE)
+
+            now_awake = self.is_state(State.AWAKE)
+            # where s_u changed state, it changes the awake common neighbor
+            # count of every pair of its neighbors
+            b = np.nonzero(now_awake[rows, u] != awake[rows, u])[0]
+            if len(b):
+                change = now_awake[b, u[b]].astype(float) - awake[b, u[b]]
+                hop_2_awake[b] += change[:, None, None] * \
+                    Af[b, :, u[b]][:, :, None] * Af[b, u[b], :][:, None, :]
+                best_hop_2[b] = np.where(hop_2_awake[b] > 1, hop_2_pair[b],
+                                         -np.inf).max(axis=(1, 2))
+            awake = now_awake
+
+    def update_properties(self):
+        """
+        Recalculate isolated and l_main, see Sensor.update_properties
+        """
+        self.isolated = self.is_sensor & (self.target < 0)
+        self.l_main[:, 1:] = self.received[:, 1:].sum(axis=2)
+        self.set_state(self.E <= 0, State.DEAD)
+        self.state[:, 0] = State.AWAKE.value
+
+    def save_metrics(self):
+        self.metrics['alive'].append(self.is_state(State.AWAKE).sum(axis=1))
+        self.metrics['sleeping'].append(self.is_state(State.SLEEP).sum(axis=1))
+        self.metrics['dead'].append(self.is_state(State.DEAD).sum(axis=1))
+        self.metrics['isolated'].append(self.isolated.sum(axis=1))
+
+    def step(self, k=3):
+        """
+        Advance every network by one round
+        :param k: ECCKN k
+        """
+        self.transmit_beacon(self.is_sensor & ~self.is_state(State.DEAD))
+        self.run_ECCKN(k)
+        self.save_metrics()
+
+        self.update_topology()
+        self.update_targets()
+        self.transmit_main()
+
+        self.E[:, 0] -= 115.85+1018.5+0.0001 + self.controller_usage
+        self.update_properties()
+        self.E += self.pv.get_E() / self.n_nodes
+
+    def run(self, rounds=100, k=3):
+        for _ in range(rounds):
+            self.step(k)
+        return self.get_metrics()
+
+    def get_metrics(self):
+        """
+        :return: Dict of METRICS arrays of shape (rounds, networks)
+        """
+        return {name: np.array(series).reshape(-1, self.n_networks)
+                for name, series in self.metrics.items()}
+
+    def export(self, fn=None):
+        """
+        Write one row per round and network with every metric
+        :param fn: CSV file name
+        """
+        if fn is None:
+            fn = "batch.csv"
+        metrics = self.get_metrics()
+        with open(fn, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['round', 'network'] + METRICS)
+            for i in range(len(metrics['alive'])):
+                for b in range(self.n_networks):
+                    writer.writerow([i, b] + [int(metrics[name][i, b])
+                                              for name in METRICS])
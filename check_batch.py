@@ -0,0 +1,64 @@
+import argparse
+import sys
+import tempfile
+
+import main
+from batch import BatchSimulation, METRICS
+
+"""
+Check that a seeded BatchSimulation of one network reproduces the state
+metrics of main.run for the same config, e.g.
+
+    python check_batch.py --nodes 20 --rounds 20 --k 0 3 10 --pv-area 0 1.23
+"""
+
+
+def read_metric(fn):
+    """
+    :param fn: State metric file written by main.run
+    :return: List of the node count of every round
+    """
+    with open(fn) as f:
+        return [int(line.split(',')[1].strip('( ')) for line in f]
+
+
+def check(config):
+    """
+    :param config: Config dict, see main.DEFAULTS
+    :return: List of the METRICS that differ
+    """
+    with tempfile.TemporaryDirectory() as out:
+        main.run(dict(config, out=out, quiet=True, export=False,
+                      render=False, trace=False, batch=0))
+        expected = {name: read_metric('{}/{}.txt'.format(out, name))
+                    for name in METRICS}
+
+    s = BatchSimulation(n_networks=1, n_nodes=config['nodes'],
+                        pv_area=config['pv_area'], seed=config['seed'])
+    metrics = s.run(config['rounds'], k=config['k'])
+    return [name for name in METRICS
+            if metrics[name][:, 0].tolist() != expected[name]]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare BatchSimulation against main.run')
+    parser.add_argument('--nodes', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--k', type=int, nargs='+', default=[0, 3, 4, 5, 10, 25])
+    parser.add_argument('--pv-area', dest='pv_area', type=float, nargs='+',
+                        default=[0.0, 1.23])
+    args = parser.parse_args()
+
+    failed = False
+    for seed in args.seeds:
+        for k in args.k:
+            for pv_area in args.pv_area:
+                config = dict(main.DEFAULTS, nodes=args.nodes, rounds=args.rounds,
+                              seed=seed, k=k, pv_area=pv_area)
+                diff = check(config)
+                print('seed={} k={} pv_area={}: {}'.format(
+                    seed, k, pv_area, 'differs in ' + ', '.join(diff) if diff else 'ok'))
+                failed |= bool(diff)
+    sys.exit(1 if failed else 0)
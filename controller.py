@@ -1,10 +1,9 @@
 from copy import deepcopy
 
 import networkx as nx
-import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
 
+from event_trace import TraceWriter
+from ledger import EnergyLedger, Phase
 from sensor import Sensor
 from utils import get_dupes, complete_graph_from_list
 
@@ -36,8 +35,11 @@ class Controller:
         self.shortest_path = {}
         self.orig_topology = None
         self.current_topology = None
+        self.trace = None
 
-        self.df_E = pd.DataFrame()
+        # pandas and matplotlib are imported on first use, so runs that
+        # neither render nor export E_rank skip their import time
+        self.df_E = None
 
         while True:
             self.sensor_nodes = [Sensor() for _ in range(self.n_nodes)]
@@ -53,6 +55,10 @@ class Controller:
                 break
 
         self.sensor_nodes.sort(reverse=True)
+        self.ledger = EnergyLedger(len(self.sensor_nodes))
+        for i, node in enumerate(self.sensor_nodes):
+            node.node_id = i
+            node.ledger = self.ledger
         node_names_list = [node.get_name() for node in self.sensor_nodes]
         self.node_attr = dict(zip(node_names_list, self.sensor_nodes))
 
@@ -100,7 +106,8 @@ class Controller:
         self.current_topology, self.shortest_path = self.update_topology_shortest_path()
         # Setting initial sensor node targets')
         self.update_sensor_node_targets()
-        self.node.update_energy(-1519)
+        self.node.update_energy(-1519, Phase.CONTROLLER_OVERHEAD)
+        self.ledger.end_setup()
 
     def update_topology_shortest_path(self, new_graph=None, init=False):
         """
@@ -160,9 +167,33 @@ class Controller:
         for node in self.sensor_nodes:
             node.update_properties()
 
+    def start_trace(self, fn=None):
+        """
+        Record the events of every sensor node to a binary event trace
+        :param fn: Trace file name
+        :return: TraceWriter, call begin_round at the start of each round
+        """
+        if fn is None:
+            fn = "trace.bin"
+        self.trace = TraceWriter(
+            fn, [node.get_name() for node in self.sensor_nodes])
+        for node in self.sensor_nodes:
+            node.trace = self.trace
+        return self.trace
+
+    def stop_trace(self):
+        for node in self.sensor_nodes:
+            node.trace = None
+        self.trace.close()
+        self.trace = None
+
     def draw(self, fn=None):
         if fn is None:
             fn = "graph.png"
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
         f = plt.figure(figsize=(10,10))
         nx.draw_networkx(
             self.current_topology,
@@ -175,11 +206,23 @@ class Controller:
         plt.close(f)
 
     def save_erank(self, col=0):
+        import pandas as pd
+
+        if self.df_E is None:
+            self.df_E = pd.DataFrame()
         self.df_E['time_' +
                   str(col)] = pd.Series(self.node.E_rank_u_neighbors_beacon)
 
-    def export_erank(self):
-        self.df_E.to_csv('df_erank.csv')
+    def export_erank(self, fn=None):
+        if fn is None:
+            fn = "df_erank.csv"
+        if self.df_E is not None:
+            self.df_E.to_csv(fn)
+
+    def export_ledger(self, fn=None):
+        if fn is None:
+            fn = "ledger.csv"
+        self.ledger.export(fn, [node.get_name() for node in self.sensor_nodes])
 
     def __repr__(self):
         return self.name
@@ -333,4 +376,4 @@ class Controller:
 
     def update_energy(self, energy):
         for node in self.sensor_nodes:
-            node.update_energy(energy / self.n_nodes)
\ No newline at end of file
+            node.update_energy(energy / self.n_nodes, Phase.HARVEST)
\ No newline at end of file
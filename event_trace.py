@@ -0,0 +1,246 @@
+import os
+import struct
+from array import array
+from enum import IntEnum
+
+import numpy as np
+
+"""
+Append-only binary event trace of a simulation run.
+
+A trace at `path` is made of three files:
+    path        fixed-size event records, in the order they happened
+    path.rounds one (round, first record, record count) entry per round
+    path.nodes  per node record numbers, written when the trace is closed
+plus a `path.names` text file mapping node ids to names.
+
+All of them are laid out so that TraceReader can open them memory-mapped
+and jump to a round or node without reading the whole trace. Records and
+round entries are flushed at the end of every round; a trace that was
+never closed has no `path.nodes`, and TraceReader rebuilds the missing
+indexes from the records instead.
+"""
+
+MAGIC = b'ECCKNTR1'
+
+# round, event, src, dst, value -- padded to 24 bytes so records stay aligned
+RECORD = struct.Struct('<IB3xiid')
+RECORD_DTYPE = np.dtype({
+    'names': ['round', 'event', 'src', 'dst', 'value'],
+    'formats': ['<u4', 'u1', '<i4', '<i4', '<f8'],
+    'offsets': [0, 4, 8, 12, 16],
+    'itemsize': RECORD.size})
+
+ROUND = struct.Struct('<IQQ')
+ROUND_DTYPE = np.dtype([('round', '<u4'), ('start', '<u8'), ('count', '<u8')])
+
+
+class Event(IntEnum):
+    """
+    Event kinds. `src` is the node the event happened at and `dst` the
+    receiving node of transmissions. `value` holds the energy used for
+    transmissions and receptions, and the new State value for state
+    transitions.
+    """
+    TX_BEACON = 1
+    TX_MAIN = 2
+    RX_BEACON = 3
+    RX_MAIN = 4
+    STATE = 5
+    ISOLATED = 6
+    CONTROLLER_TX = 7
+
+
+class TraceWriter:
+    def __init__(self, path, node_names, buffer_size=1 << 20):
+        """
+        :param path: Trace file path, index files are written next to it
+        :param node_names: List of node names, indexed by Sensor.node_id
+        :param buffer_size: Size in bytes of the write buffer
+        """
+        self.path = path
+        self.round = 0
+        self.n_records = 0
+        self.round_start = 0
+
+        # the node index of a previous trace at path would not match the new
+        # records if this one is never closed
+        if os.path.exists(path + '.nodes'):
+            os.remove(path + '.nodes')
+
+        self.f = open(path, 'wb', buffering=buffer_size)
+        self.f.write(MAGIC)
+        self.f_rounds = open(path + '.rounds', 'wb')
+
+        # record numbers of each node's events, as src or dst
+        self.node_records = [array('Q') for _ in node_names]
+        with open(path + '.names', 'w') as f:
+            f.write('\n'.join(node_names) + '\n')
+
+    def begin_round(self, i):
+        """
+        Close the index entry of the current round and start round i
+        :param i: Round number
+        """
+        self.end_round()
+        self.round = i
+
+    def end_round(self):
+        """
+        Flush the records of the current round, then its index entry
+        """
+        if self.n_records > self.round_start:
+            self.f.flush()
+            self.f_rounds.write(ROUND.pack(
+                self.round, self.round_start, self.n_records - self.round_start))
+            self.f_rounds.flush()
+        self.round_start = self.n_records
+
+    def record(self, event, src, dst=-1, value=0.0):
+        """
+        Append an event to the trace
+        :param event: Event kind
+        :param src: node_id of the sending (or changing) node
+        :param dst: node_id of the receiving node, -1 if none
+        :param value: Energy used or new state value
+        """
+        self.f.write(RECORD.pack(self.round, event, src, dst, value))
+        self.node_records[src].append(self.n_records)
+        if dst >= 0 and dst != src:
+            self.node_records[dst].append(self.n_records)
+        self.n_records += 1
+
+    def close(self):
+        """
+        Flush the records and write the per node index
+        """
+        self.end_round()
+        self.f.close()
+        self.f_rounds.close()
+
+        offsets = np.zeros(len(self.node_records) + 1, dtype='<u8')
+        offsets[1:] = np.cumsum([len(r) for r in self.node_records])
+        with open(self.path + '.nodes', 'wb') as f:
+            f.write(struct.pack('<Q', len(self.node_records)))
+            f.write(offsets.tobytes())
+            for records in self.node_records:
+                f.write(np.frombuffer(records, dtype='<u8').tobytes()
+                        if len(records) else b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _memmap(path, dtype, offset=0):
+    """
+    Read-only memory map of path past offset, np.memmap refuses empty maps
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
+    n = (size - offset) // np.dtype(dtype).itemsize
+    if n <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(n,))
+
+
+class TraceReader:
+    def __init__(self, path):
+        """
+        :param path: Trace file path, as given to TraceWriter
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not an event trace: ' + path)
+
+        self.records = _memmap(path, RECORD_DTYPE, offset=len(MAGIC))
+        with open(path + '.names') as f:
+            self.names = f.read().splitlines()
+        self.node_ids = {name: i for i, name in enumerate(self.names)}
+
+        self.rounds = _memmap(path + '.rounds', ROUND_DTYPE) \
+            if os.path.exists(path + '.rounds') else np.empty(0, ROUND_DTYPE)
+        if self.rounds['count'].sum() != len(self.records):
+            self.rounds = self.index_rounds()
+
+        self.node_offsets, self.node_records = None, None
+        if os.path.exists(path + '.nodes'):
+            self.read_node_index(path + '.nodes')
+        if self.node_offsets is None:
+            self.node_offsets, self.node_records = self.index_nodes()
+
+    def read_node_index(self, fn):
+        """
+        Open the node index written by TraceWriter.close, unless it does not
+        match the names and records of this trace
+        :param fn: Node index file name
+        """
+        with open(fn, 'rb') as f:
+            n_nodes, = struct.unpack('<Q', f.read(8))
+        if n_nodes != len(self.names):
+            return
+        node_offsets = _memmap(fn, '<u8', offset=8)[:n_nodes + 1]
+        node_records = _memmap(fn, '<u8', offset=8 * (n_nodes + 2))
+        if len(node_offsets) != n_nodes + 1 or \
+                node_offsets[-1] != len(node_records) or \
+                (len(node_records) and node_records.max() >= len(self.records)):
+            return
+        self.node_offsets, self.node_records = node_offsets, node_records
+
+    def index_rounds(self):
+        """
+        Rebuild the round index of a trace whose writer was not closed,
+        rounds are recorded in increasing order
+        :return: Structured array of (round, start, count)
+        """
+        rounds, start, count = np.unique(
+            self.records['round'], return_index=True, return_counts=True)
+        index = np.empty(len(rounds), dtype=ROUND_DTYPE)
+        index['round'], index['start'], index['count'] = rounds, start, count
+        return index
+
+    def index_nodes(self):
+        """
+        Rebuild the node index of a trace whose writer was not closed
+        :return: Offsets into, and record numbers sorted by node_id
+        """
+        src = self.records['src'].astype(np.int64)
+        dst = self.records['dst'].astype(np.int64)
+        numbers = np.arange(len(self.records), dtype='<u8')
+        to_dst = (dst >= 0) & (dst != src)
+        nodes = np.concatenate([src, dst[to_dst]])
+        numbers = np.concatenate([numbers, numbers[to_dst]])
+        order = np.lexsort((numbers, nodes))
+        offsets = np.zeros(len(self.names) + 1, dtype='<u8')
+        offsets[1:] = np.cumsum(np.bincount(nodes, minlength=len(self.names)))
+        return offsets, numbers[order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def get_round(self, i):
+        """
+        :param i: Round number
+        :return: Structured array of the events of round i
+        """
+        idx = np.searchsorted(self.rounds['round'], i)
+        if idx == len(self.rounds) or self.rounds['round'][idx] != i:
+            return self.records[:0]
+        start = int(self.rounds['start'][idx])
+        return self.records[start:start + int(self.rounds['count'][idx])]
+
+    def get_node(self, node):
+        """
+        :param node: node_id or node name
+        :return: Structured array of the events node sent or received
+        """
+        if isinstance(node, str):
+            node = self.node_ids[node]
+        start, end = self.node_offsets[node], self.node_offsets[node + 1]
+        return self.records[self.node_records[start:end]]
+
+    def get_name(self, node_id):
+        return self.names[node_id] if node_id >= 0 else '-'
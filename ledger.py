@@ -0,0 +1,79 @@
+import csv
+from enum import IntEnum
+
+import numpy as np
+
+
+class Phase(IntEnum):
+    """
+    Categories of energy spent (negative) or gained (positive) by a node
+    """
+    BEACON_TX = 0
+    MAIN_TX = 1
+    RX = 2
+    CONTROLLER_TX = 3
+    CONTROLLER_OVERHEAD = 4
+    HARVEST = 5
+
+
+class EnergyLedger:
+    def __init__(self, n_nodes):
+        """
+        Per node energy totals by Phase, one row of totals kept per round,
+        and one for the network setup before the first round
+        :param n_nodes: Number of nodes, indexed by Sensor.node_id
+        """
+        self.n_nodes = n_nodes
+        self.E = np.zeros((n_nodes, len(Phase)))
+        self.setup = np.zeros((n_nodes, len(Phase)))
+        self.rounds = []
+
+    def add(self, node_id, phase, energy):
+        self.E[node_id, phase] += energy
+
+    def end_setup(self):
+        """
+        Move the energy added so far to the setup row, so that it does not
+        count towards the first round
+        """
+        self.setup += self.E
+        self.E = np.zeros((self.n_nodes, len(Phase)))
+
+    def end_round(self):
+        """
+        Close the totals of the current round and start a new one
+        """
+        self.rounds.append(self.E)
+        self.E = np.zeros((self.n_nodes, len(Phase)))
+
+    def get_rounds(self):
+        """
+        :return: Array of shape (rounds, nodes, phases)
+        """
+        if not self.rounds:
+            return np.zeros((0, self.n_nodes, len(Phase)))
+        return np.stack(self.rounds)
+
+    def get_totals(self):
+        """
+        :return: Array of shape (nodes, phases) summed over the setup, the
+            closed rounds and the current round
+        """
+        return self.setup + self.get_rounds().sum(axis=0) + self.E
+
+    def export(self, fn, node_names=None):
+        """
+        Write one row per round and node with the energy of each phase,
+        preceded by the setup rows with round "setup"
+        :param fn: CSV file name
+        :param node_names: List of node names, indexed by node_id
+        """
+        with open(fn, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['round', 'node'] +
+                            [phase.name.lower() for phase in Phase])
+            for i, E in [('setup', self.setup)] + list(enumerate(self.rounds)):
+                for node_id in range(self.n_nodes):
+                    writer.writerow(
+                        [i, node_id if node_names is None else node_names[node_id]] +
+                        E[node_id].tolist())
@@ -1,63 +1,219 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from batch import BatchSimulation
 from controller import Controller
 from PV import PV
+from ledger import Phase
 from utils import calc_sensor_distance
 
+"""
+Headless entry point of the simulation, e.g.
+
+    python main.py --nodes 50 --k 10 --rounds 100 --out results/
+    python main.py --config run.json --seed 3 --render
+    python main.py --batch 200 --out results/
+
+A config file is a JSON object with any of the DEFAULTS keys. Command line
+options override the config file, which overrides DEFAULTS. Rendering
+imports matplotlib and exporting E_rank imports pandas, neither is
+imported otherwise. With --batch, that many networks are simulated together
+by BatchSimulation and only their state metrics are written, so asking for
+render, export or trace as well is an error.
+"""
+
+DEFAULTS = {
+    'nodes': 50,
+    'k': 10,
+    'rounds': 100,
+    'pv_area': 1.23,
+    'seed': None,
+    'out': '.',
+    'render': False,
+    'export': True,
+    'trace': False,
+    'quiet': False,
+    'batch': 0,
+}
+
+# toggles of the per-node outputs, which BatchSimulation does not produce
+BATCH_UNSUPPORTED = ['render', 'export', 'trace']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='SDN based ECCKN wireless sensor network simulation')
+    parser.add_argument('--config', help='JSON config file')
+    parser.add_argument('--nodes', type=int, help='Number of sensor nodes')
+    parser.add_argument('--k', type=int, help='ECCKN k')
+    parser.add_argument('--rounds', type=int, help='Number of rounds')
+    parser.add_argument('--pv-area', dest='pv_area', type=float,
+                        help='Solar panel area in m^2')
+    parser.add_argument('--seed', type=int, help='Random seed of node positions')
+    parser.add_argument('--out', help='Output directory')
+    parser.add_argument('--render', action='store_true', default=None,
+                        help='Draw the topology of every round')
+    parser.add_argument('--no-render', dest='render', action='store_false')
+    parser.add_argument('--export', action='store_true', default=None,
+                        help='Export E_rank and energy ledger CSVs')
+    parser.add_argument('--no-export', dest='export', action='store_false')
+    parser.add_argument('--trace', action='store_true', default=None,
+                        help='Write a binary event trace')
+    parser.add_argument('--no-trace', dest='trace', action='store_false')
+    parser.add_argument('--quiet', action='store_true', default=None,
+                        help='Do not print progress')
+    parser.add_argument('--batch', type=int,
+                        help='Simulate this many networks with BatchSimulation')
+    return parser.parse_args(argv)
+
+
+def load_config(args):
+    """
+    :param args: Parsed command line arguments
+    :return: Config dict of DEFAULTS overridden by the config file and args
+    """
+    config = dict(DEFAULTS)
+    file_config = {}
+    if args.config is not None:
+        with open(args.config) as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULTS)
+        if unknown:
+            raise ValueError('Unknown config keys: ' + ', '.join(sorted(unknown)))
+    arg_config = {key: value for key, value in vars(args).items()
+                  if key in DEFAULTS and value is not None}
+    config.update(file_config)
+    config.update(arg_config)
+
+    if config['batch']:
+        unsupported = [key for key in BATCH_UNSUPPORTED
+                       if config[key] and (key in file_config or key in arg_config)]
+        if unsupported:
+            raise ValueError('Not supported with batch: ' + ', '.join(unsupported))
+    return config
+
+
+def run(config):
+    """
+    Run one simulation, or config['batch'] networks with run_batch, writing
+    the state metrics to config['out']
+    :param config: Config dict, see DEFAULTS
+    :return: Controller at the end of the run, or the BatchSimulation if
+        config['batch'] is set
+    """
+    out = config['out']
+    os.makedirs(out, exist_ok=True)
+    if config['batch']:
+        return run_batch(config)
+    if config['seed'] is not None:
+        np.random.seed(config['seed'])
+
+    c = Controller(n_nodes=config['nodes'])
+    pv = PV(area=config['pv_area'])
+    f_alive = open(os.path.join(out, 'alive.txt'), 'w')
+    f_iso = open(os.path.join(out, 'isolated.txt'), 'w')
+    f_dead = open(os.path.join(out, 'dead.txt'), 'w')
+    f_sleeping = open(os.path.join(out, 'sleeping.txt'), 'w')
+    trace = None
+    if config['trace']:
+        trace = c.start_trace(os.path.join(out, 'trace.bin'))
+
+    if not config['quiet']:
+        print('Controller initialized')
+
+    # the state metrics and trace of the rounds run so far are kept even if
+    # a round fails
+    try:
+        for i in range(config['rounds']):
+            if not config['quiet']:
+                print('Round: ' + str(i))
+            if trace is not None:
+                trace.begin_round(i)
+            # Epoch i
+            #    Beacon
+            for node in c.sensor_nodes:
+                node.transmit(main=False)
+            # print(c.node.E_rank_u_neighbors_beacon)
+            #    Run ECCKN
+            c.run_ECCKN(k=config['k'])
+
+            # print(controller.node.E_rank_u_neighbors)
+            f_alive.write(str(i) + ',' + str(c.get_alive_nodes()) + '\n')
+            f_iso.write(str(i) + ',' + str(c.get_isolated_nodes()) + '\n')
+            f_dead.write(str(i) + ',' + str(c.get_dead_nodes()) + '\n')
+            f_sleeping.write(
+                str(i) + ',' + str(c.get_sleeping_nodes()) + '\n')
+
+            # print('## Update topology ##')
+            c.current_topology, c.shortest_path = c.update_topology_shortest_path()
+            # print(c.shortest_path)
+
+            # print('## Update sensor node targets ##')
+            c.update_sensor_node_targets()
+
+            #    Execution
+            for node in c.sensor_nodes:
+                node.transmit()
+
+            c.node.update_energy(-1.0 * (115.85+1018.5+0.0001),
+                                 Phase.CONTROLLER_OVERHEAD)
+
+            #   Controller transmit beacon data to all nodes (for now)
+            for node in c.sensor_nodes:
+                c.node.transmit(controller_distance=calc_sensor_distance(c.node, node),
+                                controller_target=node)
+
+            # post-update properties
+            c.update_sensor_properties()
+
+            # PV energy
+            c.update_energy(pv.get_E())
+            c.ledger.end_round()
+
+            if config['render']:
+                # print('## Drawing.. ##')
+                c.draw(os.path.join(out, "t" + str(i) + ".png"))
+
+            if config['export']:
+                # print('## saving E_rank..')
+                c.save_erank(i)
+
+        if config['export']:
+            c.export_erank(os.path.join(out, 'df_erank.csv'))
+            c.export_ledger(os.path.join(out, 'ledger.csv'))
+    finally:
+        for f in (f_alive, f_iso, f_dead, f_sleeping):
+            f.close()
+        if trace is not None:
+            c.stop_trace()
+    if not config['quiet']:
+        print('DONE!')
+    return c
+
+
+def run_batch(config):
+    """
+    Run config['batch'] networks together, writing their state metrics to
+    batch.csv in config['out']
+    :param config: Config dict, see DEFAULTS
+    :return: BatchSimulation at the end of the run
+    """
+    if config['render'] or config['trace']:
+        raise ValueError('Not supported with batch: render, trace')
+    s = BatchSimulation(n_networks=config['batch'], n_nodes=config['nodes'],
+                        pv_area=config['pv_area'], seed=config['seed'])
+    for i in range(config['rounds']):
+        if not config['quiet']:
+            print('Round: ' + str(i))
+        s.step(k=config['k'])
+    s.export(os.path.join(config['out'], 'batch.csv'))
+    if not config['quiet']:
+        print('DONE!')
+    return s
+
+
 if __name__ == '__main__':
-    c = Controller(n_nodes=50)
-    pv = PV()
-    f_alive = open('alive.txt', 'w')
-    f_iso = open('isolated.txt', 'w')
-    f_dead = open('dead.txt', 'w')
-    f_sleeping = open('sleeping.txt', 'w')
-
-    print('Controller initialized')
-  
-    for i in range(100):
-        print('Round: ' + str(i))
-        # Epoch i
-        #    Beacon
-        for node in c.sensor_nodes:
-            node.transmit(main=False)
-        # print(c.node.E_rank_u_neighbors_beacon)
-        #    Run ECCKN
-        c.run_ECCKN(k=10)
-
-        # print(controller.node.E_rank_u_neighbors)
-        f_alive.write(str(i) + ',' + str(c.get_alive_nodes()) + '\n')
-        f_iso.write(str(i) + ',' + str(c.get_isolated_nodes()) + '\n')
-        f_dead.write(str(i) + ',' + str(c.get_dead_nodes()) + '\n')
-        f_sleeping.write(
-            str(i) + ',' + str(c.get_sleeping_nodes()) + '\n')
-
-        # print('## Update topology ##')
-        c.current_topology, c.shortest_path = c.update_topology_shortest_path()
-        # print(c.shortest_path)
-
-        # print('## Update sensor node targets ##')
-        c.update_sensor_node_targets()
-
-        #    Execution
-        for node in c.sensor_nodes:
-            node.transmit()
-
-        c.node.update_energy(-1.0 * (115.85+1018.5+0.0001))
-
-        #   Controller transmit beacon data to all nodes (for now)
-        for node in c.sensor_nodes:
-            c.node.transmit(controller_distance=calc_sensor_distance(c.node, node))
-
-        # post-update properties
-        c.update_sensor_properties()
-
-        # PV energy
-        c.update_energy(pv.get_E())
-
-        # print('## Drawing.. ##')
-        c.draw("t" + str(i) + ".png")
-
-        # print('## saving E_rank..')
-        c.save_erank(i)
-
-        
-    c.export_erank()
-    print('DONE!')
+    run(load_config(parse_args()))
@@ -0,0 +1,56 @@
+import argparse
+
+from event_trace import Event, TraceReader
+from utils import State
+
+"""
+Replay and query an event trace written by Controller.start_trace, e.g.
+
+    python replay.py trace.bin --round 10
+    python replay.py trace.bin --node "(12, 40)" --event TX_MAIN
+"""
+
+
+def format_event(reader, record):
+    event = Event(record['event'])
+    line = '{:>5} {:<13} {:>12} -> {:<12}'.format(
+        int(record['round']), event.name,
+        reader.get_name(int(record['src'])), reader.get_name(int(record['dst'])))
+    if event == Event.STATE:
+        return line + ' ' + State(int(record['value'])).name
+    return line + ' {:.4f}'.format(float(record['value']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query an event trace')
+    parser.add_argument('trace', help='Trace file name')
+    parser.add_argument('--round', type=int, help='Only events of this round')
+    parser.add_argument('--node', help='Only events of this node_id or name')
+    parser.add_argument('--event', choices=[e.name for e in Event],
+                        help='Only events of this kind')
+    parser.add_argument('--summary', action='store_true',
+                        help='Print event counts and energy per kind')
+    args = parser.parse_args()
+
+    reader = TraceReader(args.trace)
+    if args.node is not None:
+        records = reader.get_node(
+            int(args.node) if args.node.isdigit() else args.node)
+        if args.round is not None:
+            records = records[records['round'] == args.round]
+    elif args.round is not None:
+        records = reader.get_round(args.round)
+    else:
+        records = reader.records
+    if args.event is not None:
+        records = records[records['event'] == Event[args.event]]
+
+    if args.summary:
+        for event in Event:
+            values = records['value'][records['event'] == event]
+            print('{:<13} {:>10} {:>16.4f}'.format(
+                event.name, len(values),
+                values.sum() if event != Event.STATE else 0))
+    else:
+        for record in records:
+            print(format_event(reader, record))
@@ -1,5 +1,7 @@
 import numpy as np
 
+from event_trace import Event
+from ledger import Phase
 from utils import State
 
 
@@ -32,14 +34,20 @@ class Sensor:
         self.E_rank_u_neighbors_main = {}
         self.isolated = False
 
+        # set by the controller, node_id indexes the event trace and ledger
+        self.node_id = -1
+        self.trace = None
+        self.ledger = None
+
     def update_state(self, new_state):
         """
         :param new_state: must be a valid state determined by State class
         :return: Nothing if new_state is not a valid state
         """
         if State.is_valid(self.state, new_state):
+            if self.trace is not None and new_state != self.state:
+                self.trace.record(Event.STATE, self.node_id, value=new_state.value)
             self.state = new_state
-            print("updated: {}".format(self.state))
         else:
             return
 
@@ -51,7 +59,10 @@ class Sensor:
         """
         # TODO: except for limited energy scenarios
         if not self.is_controller:
-            self.isolated = True if self.target_main is None else False
+            isolated = True if self.target_main is None else False
+            if self.trace is not None and isolated and not self.isolated:
+                self.trace.record(Event.ISOLATED, self.node_id)
+            self.isolated = isolated
             self.l_main = len(self.E_rank_u_neighbors_main.items())
 
             # TODO: think about this.
@@ -68,12 +79,16 @@ class Sensor:
         """
         return self.pos_x, self.pos_y
 
-    def update_energy(self, energy):
+    def update_energy(self, energy, phase=None):
         """
         Updates the E_rank_u
+        :param energy: Energy gained, negative if spent
+        :param phase: Phase to account the energy to in the ledger
         :return:
         """
         self.E_rank_u += energy
+        if self.ledger is not None and phase is not None:
+            self.ledger.add(self.node_id, phase, energy)
 
     def wake_up(self):
         """
@@ -110,11 +125,13 @@ class Sensor:
                 self.target_beacon = target
                 self.target_beacon_distance = target_distance
 
-    def transmit(self, main=True, controller_distance=0):
+    def transmit(self, main=True, controller_distance=0, controller_target=None):
         """
         Transmit beacon data, if possible
         Prevent controller sensor node from transmitting main data
         :param main: True if transmitting main data
+        :param controller_distance: Distance of the controller transmission
+        :param controller_target: Sensor node object the controller transmits to
         """
         if self.state != State.DEAD and not self.is_controller:
             if main and self.state == State.AWAKE and self.target_main is not None:
@@ -125,9 +142,14 @@ class Sensor:
                     self.l_main *
                     self.target_main_distance ** 2)
                 if E_usage <= self.E_rank_u:
-                    self.update_energy(-1.0 * E_usage)
+                    if self.trace is not None:
+                        self.trace.record(Event.TX_MAIN, self.node_id,
+                                          self.target_main.node_id, E_usage)
+                    self.update_energy(-1.0 * E_usage, Phase.MAIN_TX)
                     self.target_main.receive((self.get_name(), self.E_rank_u))
                 else:
+                    if self.trace is not None and not self.isolated:
+                        self.trace.record(Event.ISOLATED, self.node_id)
                     self.isolated = True
 
             else:
@@ -139,9 +161,10 @@ class Sensor:
                     self.target_beacon_distance ** 2)
 
                 if E_usage <= self.E_rank_u:
-                    print(self.get_name())
-                    print("E_usage: {}, E_rank_u: {}".format(E_usage, self.E_rank_u))
-                    self.update_energy(-1.0 * E_usage)
+                    if self.trace is not None:
+                        self.trace.record(Event.TX_BEACON, self.node_id,
+                                          self.target_beacon.node_id, E_usage)
+                    self.update_energy(-1.0 * E_usage, Phase.BEACON_TX)
                     self.target_beacon.receive(
                         (self.get_name(), self.E_rank_u), main=False)
         
@@ -153,7 +176,12 @@ class Sensor:
                     self.l_beacon *
                     controller_distance ** 2)
 
-            self.update_energy(-1.0 * E_usage)
+            if self.trace is not None:
+                self.trace.record(
+                    Event.CONTROLLER_TX, self.node_id,
+                    -1 if controller_target is None else controller_target.node_id,
+                    E_usage)
+            self.update_energy(-1.0 * E_usage, Phase.CONTROLLER_TX)
 
 
     def receive(self, neighbor_E_rank_u, main=True):
@@ -164,11 +192,17 @@ class Sensor:
         """
         if self.state != State.DEAD:
             if main and self.state == State.AWAKE:
-                self.update_energy(-1.0 * self.E_elec * self.l_main)
+                if self.trace is not None:
+                    self.trace.record(Event.RX_MAIN, self.node_id,
+                                      value=self.E_elec * self.l_main)
+                self.update_energy(-1.0 * self.E_elec * self.l_main, Phase.RX)
                 self.E_rank_u_neighbors_main[neighbor_E_rank_u[0]
                                              ] = neighbor_E_rank_u[1]
             else:
-                self.update_energy(-1.0 * self.E_elec * self.l_beacon)
+                if self.trace is not None:
+                    self.trace.record(Event.RX_BEACON, self.node_id,
+                                      value=self.E_elec * self.l_beacon)
+                self.update_energy(-1.0 * self.E_elec * self.l_beacon, Phase.RX)
                 self.E_rank_u_neighbors_beacon[neighbor_E_rank_u[0]
                                                ] = neighbor_E_rank_u[1]
 